@@ -29,7 +29,11 @@ Based on the original code by https://github.com/makomi/uart2csv
 
 import os
 import sys
+import time
+import signal
 import operator
+import multiprocessing
+import ConfigParser
 import serial
 import serial.tools.list_ports
 import binascii
@@ -48,6 +52,13 @@ serial_timeout_read  = 1        # number of seconds after which we consider the
 serial_timeout_msg   = "--READ-TIMEOUT--"
 serial_too_short_msg = "--ADDR-TOO-SHORT: "
 length_device_id     = 1024
+sender_file          = "C:/zabbix/senderfile.txt"
+
+fleet_interval       = 60       # default number of seconds between two polls of the same metric
+fleet_timeout        = 120      # number of seconds after which a polling worker is considered stalled
+fleet_retry_delay    = 10       # number of seconds to wait before restarting a crashed worker
+fleet_tick           = 1        # number of seconds the supervisor sleeps between two checks
+fleet_max_pending    = 100000   # number of unwritten sender lines kept while the output file cannot be written
 
 # -----------------------------------------------------------------------------
 # global variables
@@ -105,17 +116,29 @@ def select_a_serial_port(available_ports):
             else:
                 print("[!] Invalid serial port.\n")
 
+def find_serial_ports(available_ports, port_name, port_match):
+    """
+    Return the ports named exactly port_name, or when port_name is empty the
+    ports whose description or hwid contains port_match.
+    """
+    if port_name:
+        return [port for port,_,_ in available_ports if port == port_name]
+    return [port for port,desc,hwid in available_ports if port_match in desc or port_match in hwid]
+
+def open_serial_port(port):
+    return serial.Serial(
+        port,
+        serial_baud_rate,
+        timeout  = serial_timeout_read,
+        bytesize = serial.EIGHTBITS,
+        parity   = serial.PARITY_NONE,
+        stopbits = serial.STOPBITS_ONE,
+    )
+
 def open_selected_serial_port():
     global uart
     try:
-        uart = serial.Serial(
-            selected_port,
-            serial_baud_rate,
-            timeout  = serial_timeout_read,
-            bytesize = serial.EIGHTBITS,
-            parity   = serial.PARITY_NONE,
-            stopbits = serial.STOPBITS_ONE,
-        )
+        uart = open_serial_port(selected_port)
         print("[+] Successfully connected.")
     except serial.SerialException:
         print("[!] Unable to open %s." % selected_port)
@@ -527,19 +550,410 @@ def FuncTempHumVolt(hexStr):
 
     return retall
 
+# -----------------------------------------------------------------------------
+# commands
+# -----------------------------------------------------------------------------
+
+commands = [
+    #{'AttachedMonitorCardExist' : b'\x55\xAA\x00\x00\xFE\x00\x00\x00\x00\x00\x00\x00\x20\x00\x00\x0A\x02\x00' },
+    {'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
+    #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x01\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
+    #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x02\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
+    #{'TempOfScanCard'           : b'\x55\xAA\x00\x04\xFE\x00\x01\x00\x00\x00\x00\x00\x01\x00\x00\x0A\x02\x00' },
+    {'VoltageOfScanCard'        : b'\x55\xAA\x00\x05\xFE\x00\x01\x00\x00\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
+    #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x06\xFE\x00\x01\x00\x01\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
+    #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x06\xFE\x00\x01\x00\x02\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
+    #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x02\x00\x92\x56' },
+    #{'TempOfScanCard'           : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x01\x00\x00\x0A\x02\x00\x92\x56' },
+    #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x03\x00\x00\x0A\x01\x00\x94\x56' },
+    #{'OOO'                      : b'\x55\xAA\x00\x32\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x00\x01\x91\x56'}
+    #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x00\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00'},
+    #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x01\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00\x83\x56'},
+    #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x02\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00\x83\x56'}
+    ]
+func_commands = [
+    #{'DataRefreshLux'          : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x01\x00\x00\x00\x00\x06\x07\x00\x00\x00\x00\x00\x55\xAA\x82'},
+    #{'DataReadLux'             : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x06\x07\x00'},
+    #{'DataRefresh'     : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x01\x00\x00\x00\x00\x06\x0B\x00\x00\x00\x00\x00\x55\xAA\x01\x02\x80\xFF\x81'},
+    #{'DataRead'        : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x06\x05\x00'},
+    {'FuncTempHumVolt'         : b'\x55\xAA\x00\x16\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x04\x04\x00' },
+]
+
+this_module = sys.modules[__name__]
+
+# -----------------------------------------------------------------------------
+# polling
+# -----------------------------------------------------------------------------
+
+def run_commands(cmds, cards, metrics, result, heartbeat=None):
+    """send every command to every card (card index goes into byte 8) and decode the ACKs"""
+    for cmd in cmds:
+        for k in cmd:
+            if metrics is not None and k not in metrics:
+                continue
+            for i in cards:
+                if heartbeat is not None:
+                    heartbeat()
+                s = cmd[k][:8] + struct.pack('B', i) + cmd[k][9:]
+                # a card that does not answer must not discard the other cards
+                try:
+                    res = get_data(checksum(s))
+                    if not checkAck(res):
+                        continue
+                    value = getattr(this_module, k)(res)
+                except (ValueError, IndexError) as e:
+                    print("[!] %s failed on card %d: %s" % (k, i, e))
+                    continue
+                if k in result:
+                    result[k].append((i, value))
+                else:
+                    result[k] = [(i, value)]
+                #output_data()
+
+def poll_screen(cards, multifunc_cards, metrics=None, heartbeat=None):
+    """poll the receiving cards and the multifunction cards of the screen on the open uart"""
+    global serial_read_ok
+    serial_read_ok = False
+    result = {}
+    run_commands(commands, cards, metrics, result, heartbeat)
+    run_commands(func_commands, multifunc_cards, metrics, result, heartbeat)
+    return result
+
+def format_sender_lines(hostname, result, timestamp=None):
+    """
+    Convert the poll result into zabbix_sender input lines, in the
+    "host key timestamp value" format of zabbix_sender -T when a timestamp
+    is given.
+    """
+    hostname = '"'+hostname+'"'
+    if timestamp is None:
+        sep = " "
+    else:
+        sep = " " + str(int(timestamp)) + " "
+    lines = []
+    for card,i in result.get('TempValidOfScanCard', []):
+        lines.append(hostname + " rec_card[temperature,"+str(card+1)+"]" + sep + str(i[1]) + "\n")
+    for card,i in result.get('VoltageOfScanCard', []):
+        lines.append(hostname + " rec_card[volt,"+str(card+1)+"]" + sep + str(i[1]) + "\n")
+    for card,i in result.get('FuncTempHumVolt', []):
+        lines.append(hostname + " mfun_card[volt]" + sep + str(i["volt"][1]) + "\n")
+        lines.append(hostname + " mfun_card[temperature]" + sep + str(i["temperature"][1]) + "\n")
+        lines.append(hostname + " mfun_card[humidity]" + sep + str(i["humidity"][1]) + "\n")
+    return lines
+
+# -----------------------------------------------------------------------------
+# fleet mode
+# -----------------------------------------------------------------------------
+
+def parse_card_ranges(value):
+    """parse a card list like "0-3, 5" into [0, 1, 2, 3, 5]"""
+    cards = []
+    for part in value.replace(',', ' ').split():
+        if '-' in part:
+            first,last = part.split('-', 1)
+            if int(last) < int(first):
+                raise ValueError("reversed card range: %s" % part)
+            cards.extend(range(int(first), int(last) + 1))
+        else:
+            cards.append(int(part))
+    for card in cards:
+        if card < 0 or card > 255:
+            raise ValueError("card index out of range: %d" % card)
+    return cards
+
+def parse_schedule(value, default_interval):
+    """parse a schedule like "VoltageOfScanCard:30, FuncTempHumVolt:300" on top of the default interval"""
+    if default_interval <= 0:
+        raise ValueError("interval must be positive: %d" % default_interval)
+    schedule = {}
+    for cmd in commands + func_commands:
+        for k in cmd:
+            schedule[k] = default_interval
+    for part in value.replace(',', ' ').split():
+        metric,_,interval = part.partition(':')
+        if metric not in schedule:
+            raise ValueError("unknown metric in schedule: %s" % metric)
+        schedule[metric] = int(interval)
+        if schedule[metric] <= 0:
+            raise ValueError("interval of %s must be positive: %s" % (metric, interval))
+    return schedule
+
+def load_fleet_config(path, defaults=None):
+    """
+    Read the fleet config file. Every [screen <name>] section describes one
+    screen, the optional [fleet] section holds the shared settings. The
+    screens take their defaults from `defaults` when given, so that a reload
+    does not apply half of a changed [fleet] section.
+    """
+    cfg = ConfigParser.RawConfigParser()
+    if not cfg.read(path):
+        raise IOError("unable to read %s" % path)
+
+    def get(section, option, default):
+        if cfg.has_option(section, option):
+            return cfg.get(section, option)
+        return default
+
+    fleet = {
+        'output'   : get('fleet', 'output', sender_file),
+        'interval' : int(get('fleet', 'interval', fleet_interval)),
+        'timeout'  : int(get('fleet', 'timeout', fleet_timeout)),
+    }
+
+    if fleet['interval'] <= 0:
+        raise ValueError("fleet: interval must be positive: %d" % fleet['interval'])
+    if fleet['timeout'] <= 0:
+        raise ValueError("fleet: timeout must be positive: %d" % fleet['timeout'])
+    # stdout also carries the log and the decoders' debug prints
+    if fleet['output'] == '-':
+        raise ValueError("output: '-' is not supported, use a file")
+    if defaults is None:
+        defaults = fleet
+
+    screens = {}
+    hostnames = {}    # hostname -> screen, two screens would write the same zabbix keys
+    for section in cfg.sections():
+        if section == 'fleet':
+            continue
+        if not section.startswith('screen '):
+            raise ValueError("unknown section [%s]" % section)
+        name = section[len('screen '):].strip()
+        if cfg.has_option(section, 'port') == cfg.has_option(section, 'match'):
+            raise ValueError("screen %s: set either port or match" % name)
+        try:
+            cards = parse_card_ranges(get(section, 'cards', ''))
+            multifunc_cards = parse_card_ranges(get(section, 'multifunc', ''))
+            interval = int(get(section, 'interval', defaults['interval']))
+            schedule = parse_schedule(get(section, 'schedule', ''), interval)
+        except ValueError as e:
+            raise ValueError("screen %s: %s" % (name, e))
+        if not cards and not multifunc_cards:
+            raise ValueError("screen %s: no cards and no multifunc card to poll" % name)
+        # the mfun_card[...] keys carry no card index
+        if len(multifunc_cards) > 1:
+            raise ValueError("screen %s: only one multifunc card is supported" % name)
+        hostname = get(section, 'hostname', name)
+        if hostname in hostnames:
+            raise ValueError("screen %s: hostname '%s' already used by screen %s" % (name, hostname, hostnames[hostname]))
+        hostnames[hostname] = name
+        # only keep the metrics that have cards to be read from
+        for cmds,targets in ((commands, cards), (func_commands, multifunc_cards)):
+            if not targets:
+                for cmd in cmds:
+                    for k in cmd:
+                        del schedule[k]
+        screens[name] = {
+            'hostname'  : hostname,
+            'port'      : get(section, 'port', ''),
+            'match'     : get(section, 'match', ''),
+            'cards'     : cards,
+            'multifunc' : multifunc_cards,
+            'schedule'  : schedule,
+        }
+    return fleet, screens
+
+def fleet_worker(port, screens, conn):
+    """
+    Worker process owning one serial port: poll its screens on their schedule
+    and send the sender lines to the supervisor. An empty list is a heartbeat,
+    sent before every card so that the timeout does not depend on the screen size.
+    """
+    global uart
+    # let the supervisor handle CTRL+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    uart = open_serial_port(port)
+    heartbeat = lambda: conn.send([])
+    heartbeat()
+    due = {}
+    while True:
+        for name in screens:
+            screen = screens[name]
+            now = time.time()
+            metrics = [m for m in screen['schedule'] if due.get((name, m), 0) <= now]
+            if not metrics:
+                continue
+            for m in metrics:
+                due[(name, m)] = now + screen['schedule'][m]
+            result = poll_screen(screen['cards'], screen['multifunc'], metrics, heartbeat)
+            conn.send(format_sender_lines(screen['hostname'], result, now))
+        heartbeat()
+        time.sleep(fleet_tick)
+
+def write_sender_lines(path, lines):
+    """
+    Append lines to the shared sender file. The file is reopened every time,
+    so the consumer can rename it away before feeding it to zabbix_sender -T.
+    """
+    file = open(path, 'a')
+    try:
+        file.writelines(lines)
+    finally:
+        file.close()
+
+def run_fleet(path):
+    """poll every screen of the fleet config until interrupted, reloading the config when it changes"""
+    try:
+        fleet, screens = load_fleet_config(path)
+        config_mtime = os.path.getmtime(path)
+    except (IOError, OSError, ValueError, ConfigParser.Error) as e:
+        print("[!] Invalid fleet config: %s" % e)
+        sys.exit(-1)
+
+    print("[+] Polling %d screens." % len(screens))
+
+    workers      = {}    # port -> {'process', 'conn', 'screens', 'heartbeat'}
+    assigned     = {}    # screen -> port of the worker polling it
+    restart_at   = {}    # port -> earliest restart time after a crash
+    unmatched    = set() # screens already reported as having no serial port
+    worker_count = 0     # only ever increases, names the worker processes
+    pending      = []    # sender lines not written to the output file yet
+    write_failed = False # the last write to the output file failed
+
+    def stop_worker(port):
+        worker = workers.pop(port)
+        if worker['process'].is_alive():
+            worker['process'].terminate()
+        worker['process'].join()
+        worker['conn'].close()
+        for name in worker['screens']:
+            assigned.pop(name, None)
+
+    try:
+        while True:
+            now = time.time()
+
+            # hot reload: only restart the workers polling a changed screen
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = config_mtime
+            if mtime != config_mtime:
+                config_mtime = mtime
+                try:
+                    new_fleet, new_screens = load_fleet_config(path, fleet)
+                except (IOError, ValueError, ConfigParser.Error) as e:
+                    print("[!] Invalid fleet config, keeping the previous one: %s" % e)
+                else:
+                    if new_fleet != fleet:
+                        print("[!] Changes to the [fleet] section need a restart.")
+                    for name in screens:
+                        if screens[name] != new_screens.get(name):
+                            print("[+] Stopped screen %s." % name)
+                            if name in assigned:
+                                stop_worker(assigned[name])
+                    screens = new_screens
+                    unmatched.clear()
+
+            # collect the results, restart crashed or stalled workers
+            for port in list(workers):
+                worker = workers[port]
+                while worker['conn'].poll():
+                    try:
+                        lines = worker['conn'].recv()
+                    except (EOFError, IOError):
+                        # the worker is gone, handled below
+                        break
+                    worker['heartbeat'] = now
+                    pending.extend(lines)
+                if not worker['process'].is_alive():
+                    print("[!] Worker for %s crashed (exit code %s)." % (port, worker['process'].exitcode))
+                    stop_worker(port)
+                    restart_at[port] = now + fleet_retry_delay
+                elif now - worker['heartbeat'] > fleet['timeout']:
+                    print("[!] Worker for %s stalled." % port)
+                    stop_worker(port)
+                    restart_at[port] = now + fleet_retry_delay
+
+            # write the results, keeping them for the next tick if the output file is not writable
+            if pending:
+                try:
+                    write_sender_lines(fleet['output'], pending)
+                except (IOError, OSError) as e:
+                    if not write_failed:
+                        print("[!] Unable to write %s, keeping the results: %s" % (fleet['output'], e))
+                        write_failed = True
+                    if len(pending) > fleet_max_pending:
+                        print("[!] Dropped %d unwritten results." % (len(pending) - fleet_max_pending))
+                        del pending[:-fleet_max_pending]
+                else:
+                    if write_failed:
+                        print("[+] Wrote %d kept results to %s." % (len(pending), fleet['output']))
+                        write_failed = False
+                    pending = []
+
+            # start a worker for every port with screens that are not polled
+            waiting = [name for name in screens if name not in assigned]
+            if waiting:
+                available_ports = get_available_serial_ports()
+                ports = {}
+                for name in screens:
+                    screen = screens[name]
+                    found = find_serial_ports(available_ports, screen['port'], screen['match'])
+                    # never fall back to another port: the screen stays unpolled until its port shows up
+                    if len(found) != 1:
+                        if name not in unmatched:
+                            print("[!] Screen %s not polled: %d serial ports match '%s'." % (
+                                name, len(found), screen['port'] or screen['match']))
+                            unmatched.add(name)
+                        continue
+                    unmatched.discard(name)
+                    port = found[0]
+                    ports.setdefault(port, []).append(name)
+                for port in ports:
+                    if all(name in assigned for name in ports[port]):
+                        continue
+                    if restart_at.get(port, 0) > now:
+                        continue
+                    # a screen moved to a port with a running worker: restart it with all its screens
+                    if port in workers:
+                        stop_worker(port)
+                    for name in ports[port]:
+                        if name in assigned:
+                            stop_worker(assigned[name])
+                    conn, child_conn = multiprocessing.Pipe(False)
+                    worker_count += 1
+                    process = multiprocessing.Process(
+                        target = fleet_worker,
+                        name   = "fleet-worker-%d" % worker_count,
+                        args   = (port, dict((name, screens[name]) for name in ports[port]), child_conn),
+                    )
+                    process.daemon = True
+                    process.start()
+                    child_conn.close()
+                    workers[port] = {'process': process, 'conn': conn, 'screens': ports[port], 'heartbeat': now}
+                    for name in ports[port]:
+                        assigned[name] = port
+                    print("[+] Started worker for %s: %s." % (port, ', '.join(ports[port])))
+
+            time.sleep(fleet_tick)
+    except KeyboardInterrupt:
+        print("[+] Stopping fleet.")
+    finally:
+        for port in list(workers):
+            stop_worker(port)
+
 # -----------------------------------------------------------------------------
 # main program
 # -----------------------------------------------------------------------------
 
 if __name__ == '__main__':
 
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--fleet':
+        run_fleet(sys.argv[2])
+        sys.exit(0)
+
     has_multifunc = 0
     if len(sys.argv) < 3:
         print("\nError: missing parameters.")
+        print("Usage: %s <hostname> <nb_cards> [<has_multifunc>]" % sys.argv[0])
+        print("       %s --fleet <config file>" % sys.argv[0])
         sys.exit(1)
-    hostname = '"'+sys.argv[1]+'"' #M700 Ticker Temp
+    hostname = sys.argv[1] #M700 Ticker Temp
     nb_cards = int(sys.argv[2])
-    has_multifunc = int(sys.argv[3])
+    if len(sys.argv) > 3:
+        has_multifunc = int(sys.argv[3])
 
     select_a_serial_port(get_available_serial_ports())
     open_selected_serial_port()
@@ -550,109 +964,16 @@ if __name__ == '__main__':
 
     #print_usage_guide()
 
-    commands = [
-        #{'AttachedMonitorCardExist' : b'\x55\xAA\x00\x00\xFE\x00\x00\x00\x00\x00\x00\x00\x20\x00\x00\x0A\x02\x00' },
-        {'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
-        #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x01\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
-        #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x02\x00\x00\x00\x00\x00\x00\x0A\x02\x00' },
-        #{'TempOfScanCard'           : b'\x55\xAA\x00\x04\xFE\x00\x01\x00\x00\x00\x00\x00\x01\x00\x00\x0A\x02\x00' },
-        {'VoltageOfScanCard'        : b'\x55\xAA\x00\x05\xFE\x00\x01\x00\x00\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
-        #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x06\xFE\x00\x01\x00\x01\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
-        #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x06\xFE\x00\x01\x00\x02\x00\x00\x00\x03\x00\x00\x0A\x01\x00' },
-        #{'TempValidOfScanCard'      : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x02\x00\x92\x56' },
-        #{'TempOfScanCard'           : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x01\x00\x00\x0A\x02\x00\x92\x56' },
-        #{'VoltageOfScanCard'        : b'\x55\xAA\x00\x00\xFE\x00\x01\x00\x00\x00\x00\x00\x03\x00\x00\x0A\x01\x00\x94\x56' },
-        #{'OOO'                      : b'\x55\xAA\x00\x32\xFE\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x0A\x00\x01\x91\x56'}
-        #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x00\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00'},
-        #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x01\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00\x83\x56'},
-        #{'DVISignalChecking'        : b'\x55\xAA\x00\x16\xFE\x00\x02\x00\x00\x00\x00\x00\x17\x00\x00\x02\x01\x00\x83\x56'}
-        ]
-    func_commands = [
-        #{'DataRefreshLux'          : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x01\x00\x00\x00\x00\x06\x07\x00\x00\x00\x00\x00\x55\xAA\x82'},
-        #{'DataReadLux'             : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x06\x07\x00'},
-        #{'DataRefresh'     : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x01\x00\x00\x00\x00\x06\x0B\x00\x00\x00\x00\x00\x55\xAA\x01\x02\x80\xFF\x81'},
-        #{'DataRead'        : b'\x55\xAA\x00\x15\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x06\x05\x00'},
-        {'FuncTempHumVolt'         : b'\x55\xAA\x00\x16\xFE\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x04\x04\x00' },
-    ]
-
-    this_module = sys.modules[__name__]
-
     #checksum(b'\x55\xAA\x00\x00\xFE\x00\x00\x00\x00\x00\x00\x00\x20\x00\x00\x0A\x02\x00')
 
-    while True:
+    # the multifunction card sits at index 0
+    result = poll_screen(range(0, nb_cards), [0] if has_multifunc > 0 else [])
+    print(result)
+
+    file = open(sender_file, 'w')
+    for tmp in format_sender_lines(hostname, result):
+        print tmp
+        file.write(tmp)
+    file.close()
 
-        serial_read_ok = False
-
-        # wait for enter
-        #user_input = raw_input("")
-
-        # avoid empty line between results          # FIXME: this only works on Linux terminals
-        #CURSOR_UP_ONE = '\x1b[1A'
-        #ERASE_LINE    = '\x1b[2K'
-        #print(CURSOR_UP_ONE + ERASE_LINE + CURSOR_UP_ONE)
-
-        #check_for_exit_condition()
-
-        result = {}
-
-        #print('+++RECEIVING CARDS:')     
-        for cmd in commands:
-            for k in cmd:
-                for i in range(0, nb_cards):
-                    s = cmd[k][:8] + struct.pack('B', i) + cmd[k][9:]                    
-                    #print(s)
-                    #print(checksum(s))
-
-                    cmd2 = checksum(s)
-                    #print(k)
-                    res = get_data(cmd2)
-                    if checkAck(res):
-                        if k in result:
-                            result[k].append(getattr(this_module, k)(res))
-                        else:
-                            result[k] = [getattr(this_module, k)(res)]
-                    #output_data()
-
-        #print("+++MULTIFUNC CARDS:")
-        if has_multifunc > 0:
-            for cmd in func_commands:
-                for k in cmd:
-                    #print(cmd[k])
-                    #print(checksum(cmd[k]))
-                    cmd = checksum(cmd[k])
-                    #print(k)                
-                    res = get_data(cmd)
-                    if checkAck(res):
-                        if k in result:
-                            result[k].append(getattr(this_module, k)(res))
-                        else:
-                            result[k] = [getattr(this_module, k)(res)]
-                    #output_data()
-        print(result)
-
-        file = open('C:/zabbix/senderfile.txt', 'w')        
-        count = 0
-        for i in result['TempValidOfScanCard']:
-            count = count + 1
-            tmp = hostname + " rec_card[temperature,"+str(count)+"] " + str(i[1]) +"\n"
-            print tmp
-            file.write(tmp)
-        count = 0
-        for i in result['VoltageOfScanCard']:
-            count = count + 1
-            tmp = hostname + " rec_card[volt,"+str(count)+"] " + str(i[1]) + "\n"
-            print tmp
-            file.write(tmp)
-        if 'FuncTempHumVolt' in result:
-            for i in result['FuncTempHumVolt']:
-                tmp = hostname + " mfun_card[volt] " + str(i["volt"][1]) + "\n"
-                file.write(tmp)
-                tmp = hostname + " mfun_card[temperature] " + str(i["temperature"][1]) + "\n"
-                file.write(tmp)
-                tmp = hostname + " mfun_card[humidity] " + str(i["humidity"][1]) + "\n"
-                file.write(tmp)
-        break
-
-        #handle_device_id_duplicates()
-
-        
+    #handle_device_id_duplicates()